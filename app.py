@@ -3,6 +3,9 @@ import pandas as pd
 import psycopg2
 from datetime import datetime, timezone, timedelta
 import os
+import threading
+import time
+import uuid
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
@@ -30,6 +33,25 @@ if 'last_chassi' not in st.session_state:
     st.session_state.last_chassi = ""
 if 'input_key' not in st.session_state:
     st.session_state.input_key = 0
+if 'dispositivo_id' not in st.session_state:
+    st.session_state.dispositivo_id = uuid.uuid4().hex[:6].upper()
+if 'contagem_id' not in st.session_state:
+    st.session_state.contagem_id = uuid.uuid4().hex[:8].upper()
+if 'sessao_codigo' not in st.session_state:
+    st.session_state.sessao_codigo = ""
+if 'sessao_cursor' not in st.session_state:
+    st.session_state.sessao_cursor = 0
+if 'seq_dispositivo' not in st.session_state:
+    st.session_state.seq_dispositivo = 0
+if 'sessao_loja' not in st.session_state:
+    st.session_state.sessao_loja = ""
+if 'sessao_finalizada' not in st.session_state:
+    st.session_state.sessao_finalizada = False
+if 'avisos' not in st.session_state:
+    st.session_state.avisos = []
+
+# Sessões finalizadas são removidas da memória após esse prazo (segundos)
+SESSAO_FINALIZADA_TTL = 60 * 60
 
 def conectar_banco():
     """Conecta ao banco Neon"""
@@ -47,6 +69,273 @@ def conectar_banco():
         st.error(f"Erro de conexão: {str(e)}")
         return None
 
+@st.cache_resource
+def preparar_tabelas_avistamento():
+    """Cria (uma vez por processo) as tabelas do índice global de avistamentos"""
+    conn = conectar_banco()
+    if not conn:
+        # Exceção não fica em cache: nova tentativa na próxima leitura
+        raise RuntimeError("sem conexão com o banco")
+    try:
+        cur = conn.cursor()
+        # Último avistamento de cada chassi (consulta pela chave primária)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS avistamentos_chassi (
+                chassi TEXT PRIMARY KEY,
+                loja TEXT NOT NULL,
+                sessao TEXT NOT NULL,
+                registrado_em TIMESTAMPTZ NOT NULL
+            )
+        """)
+        # Histórico de todas as leituras, usado pela verificação noturna
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS leituras_contagem (
+                chassi TEXT NOT NULL,
+                loja TEXT NOT NULL,
+                sessao TEXT NOT NULL,
+                registrado_em TIMESTAMPTZ NOT NULL
+            )
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS leituras_contagem_data_idx
+            ON leituras_contagem (registrado_em)
+        """)
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+def normalizar_loja(nome):
+    """Nome da loja usado nas comparações ("Salim Atibaia" == "salim atibaia ")"""
+    return (nome or '').strip().casefold()
+
+def registrar_avistamento(conn, chassi_numero, loja, sessao):
+    """Atualiza o índice global e retorna o avistamento anterior do chassi (ou None)"""
+    agora = datetime.now(fuso_brasilia)
+    try:
+        preparar_tabelas_avistamento()
+        cur = conn.cursor()
+        # Serializa leitura + atualização do mesmo chassi entre lojas (liberado no commit)
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (chassi_numero,))
+        cur.execute(
+            "SELECT loja, sessao, registrado_em FROM avistamentos_chassi WHERE chassi = %s",
+            (chassi_numero,)
+        )
+        resultado = cur.fetchone()
+        cur.execute("""
+            INSERT INTO avistamentos_chassi (chassi, loja, sessao, registrado_em)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (chassi) DO UPDATE
+            SET loja = EXCLUDED.loja, sessao = EXCLUDED.sessao, registrado_em = EXCLUDED.registrado_em
+        """, (chassi_numero, loja, sessao, agora))
+        cur.execute(
+            "INSERT INTO leituras_contagem (chassi, loja, sessao, registrado_em) VALUES (%s, %s, %s, %s)",
+            (chassi_numero, loja, sessao, agora)
+        )
+        conn.commit()
+        cur.close()
+    except Exception as e:
+        conn.rollback()
+        adicionar_aviso('warning', f"⚠️ Índice de avistamentos indisponível: {str(e)}")
+        return None
+
+    if resultado:
+        loja_anterior, sessao_anterior, registrado_em = resultado
+        return {'loja': loja_anterior, 'sessao': sessao_anterior, 'registrado_em': registrado_em}
+    return None
+
+@st.cache_resource
+def obter_sessoes_compartilhadas():
+    """Registro global (por processo) das sessões de contagem compartilhadas"""
+    return {'lock': threading.Lock(), 'sessoes': {}}
+
+def limpar_sessoes_compartilhadas(sessoes):
+    """Remove sessões já finalizadas (chamar com o lock adquirido).
+
+    Sessões abertas nunca são removidas: o log é a cópia da contagem que
+    ainda não virou relatório.
+    """
+    agora = time.time()
+    for codigo in list(sessoes):
+        sessao = sessoes[codigo]
+        if sessao['finalizada'] and agora - sessao['atualizada_em'] > SESSAO_FINALIZADA_TTL:
+            del sessoes[codigo]
+
+def criar_sessao_compartilhada(loja):
+    """Cria uma sessão compartilhada da loja e retorna o código para os outros dispositivos"""
+    registro_global = obter_sessoes_compartilhadas()
+    with registro_global['lock']:
+        limpar_sessoes_compartilhadas(registro_global['sessoes'])
+        codigo = uuid.uuid4().hex[:6].upper()
+        while codigo in registro_global['sessoes']:
+            codigo = uuid.uuid4().hex[:6].upper()
+        registro_global['sessoes'][codigo] = {
+            'criada_em': datetime.now(fuso_brasilia).strftime("%d/%m/%Y %H:%M"),
+            'loja': loja,           # loja usada por todos os dispositivos (avistamentos e relatório)
+            'eventos': [],          # log append-only, na ordem em que o servidor aceitou
+            'indice': {},           # chassi -> posição no log (primeira leitura vence)
+            'seq_dispositivos': {}, # dispositivo -> último número de sequência aplicado
+            'finalizada': False,
+            'atualizada_em': time.time()
+        }
+    return codigo
+
+def sessao_compartilhada_aberta(codigo):
+    """Indica se a sessão existe e ainda aceita leituras"""
+    registro_global = obter_sessoes_compartilhadas()
+    with registro_global['lock']:
+        sessao = registro_global['sessoes'].get(codigo)
+        return sessao is not None and not sessao['finalizada']
+
+def loja_sessao_compartilhada(codigo):
+    registro_global = obter_sessoes_compartilhadas()
+    with registro_global['lock']:
+        sessao = registro_global['sessoes'].get(codigo)
+        return sessao['loja'] if sessao is not None else ""
+
+def publicar_registro_compartilhado(codigo, dispositivo_id, registro):
+    """Publica uma leitura na sessão compartilhada.
+
+    O seq é atribuído quando o chassi é lido (registro['seq']) e reaproveitado
+    em reenvios. Retorna (status, registro_existente). Regras determinísticas:
+    - seq já aplicado para o dispositivo -> 'repetido' (reenvio ignorado)
+    - chassi já presente no log -> 'duplicado' (a primeira leitura vence)
+    """
+    registro_global = obter_sessoes_compartilhadas()
+    with registro_global['lock']:
+        sessao = registro_global['sessoes'].get(codigo)
+        if sessao is None:
+            return 'inexistente', None
+        if sessao['finalizada']:
+            return 'finalizada', None
+        seq = registro['seq']
+        if seq <= sessao['seq_dispositivos'].get(dispositivo_id, 0):
+            return 'repetido', None
+        sessao['seq_dispositivos'][dispositivo_id] = seq
+        sessao['atualizada_em'] = time.time()
+
+        posicao = sessao['indice'].get(registro['chassi'])
+        if posicao is not None:
+            return 'duplicado', sessao['eventos'][posicao]
+
+        evento = dict(registro, dispositivo=dispositivo_id)
+        sessao['indice'][registro['chassi']] = len(sessao['eventos'])
+        sessao['eventos'].append(evento)
+        return 'ok', evento
+
+def buscar_chassi_compartilhado(codigo, chassi_numero):
+    """Consulta O(1) se o chassi já foi lido por algum dispositivo da sessão"""
+    registro_global = obter_sessoes_compartilhadas()
+    with registro_global['lock']:
+        sessao = registro_global['sessoes'].get(codigo)
+        if sessao is None:
+            return None
+        posicao = sessao['indice'].get(chassi_numero)
+        return sessao['eventos'][posicao] if posicao is not None else None
+
+def sincronizar_sessao_compartilhada(codigo, cursor):
+    """Retorna apenas os eventos novos desde o cursor (sem reenviar a lista inteira).
+
+    O terceiro valor é o estado da sessão: 'aberta', 'finalizada' ou 'removida'
+    (não existe mais no servidor, por exemplo após reiniciar o processo).
+    """
+    registro_global = obter_sessoes_compartilhadas()
+    with registro_global['lock']:
+        sessao = registro_global['sessoes'].get(codigo)
+        if sessao is None:
+            return [], cursor, 'removida'
+        novos = sessao['eventos'][cursor:]
+        return novos, len(sessao['eventos']), 'finalizada' if sessao['finalizada'] else 'aberta'
+
+def finalizar_sessao_compartilhada(codigo):
+    """Marca a sessão como finalizada; retorna True apenas para quem finalizou primeiro"""
+    registro_global = obter_sessoes_compartilhadas()
+    with registro_global['lock']:
+        sessao = registro_global['sessoes'].get(codigo)
+        if sessao is None or sessao['finalizada']:
+            return False
+        sessao['finalizada'] = True
+        sessao['atualizada_em'] = time.time()
+        return True
+
+def reabrir_sessao_compartilhada(codigo):
+    """Desfaz a finalização quando o relatório não pôde ser gerado"""
+    registro_global = obter_sessoes_compartilhadas()
+    with registro_global['lock']:
+        sessao = registro_global['sessoes'].get(codigo)
+        if sessao is not None:
+            sessao['finalizada'] = False
+            sessao['atualizada_em'] = time.time()
+
+def sincronizar_contagem():
+    """Traz para a lista local as leituras feitas pelos outros dispositivos.
+
+    Retorna True se a sessão foi finalizada. Se a sessão foi removida, o
+    dispositivo se desconecta mantendo a lista local para finalizar sozinho.
+    """
+    codigo = st.session_state.sessao_codigo
+    if not codigo:
+        return False
+    novos, cursor, estado = sincronizar_sessao_compartilhada(codigo, st.session_state.sessao_cursor)
+    if estado == 'removida':
+        desconectar_sessao_compartilhada()
+        adicionar_aviso('warning', f"⚠️ Sessão {codigo} não existe mais; a contagem continua neste dispositivo")
+        return False
+    st.session_state.chassis.extend(novos)
+    st.session_state.sessao_cursor = cursor
+    st.session_state.sessao_finalizada = estado == 'finalizada'
+    return st.session_state.sessao_finalizada
+
+def entrar_sessao_compartilhada(codigo):
+    """Entra na sessão e envia as leituras locais já feitas neste dispositivo.
+
+    Retorna o número de chassis já lidos por outros dispositivos, ou None se a
+    sessão não aceita mais leituras (nesse caso a lista local é mantida).
+    """
+    duplicados = 0
+    for registro in st.session_state.chassis:
+        status, _ = publicar_registro_compartilhado(codigo, st.session_state.dispositivo_id, registro)
+        if status in ('finalizada', 'inexistente'):
+            return None
+        if status == 'duplicado':
+            duplicados += 1
+
+    # Leituras aceitas: a lista local passa a ser a réplica da sessão
+    st.session_state.sessao_codigo = codigo
+    st.session_state.sessao_loja = loja_sessao_compartilhada(codigo)
+    st.session_state.sessao_cursor = 0
+    st.session_state.sessao_finalizada = False
+    st.session_state.chassis = []
+    sincronizar_contagem()
+    return duplicados
+
+def desconectar_sessao_compartilhada():
+    """Desliga o dispositivo da sessão mantendo a lista local"""
+    st.session_state.sessao_codigo = ""
+    st.session_state.sessao_cursor = 0
+    st.session_state.sessao_finalizada = False
+
+def sair_sessao_compartilhada():
+    """Sai da sessão descartando a réplica local, que pertence ao relatório da sessão"""
+    if st.session_state.sessao_codigo:
+        st.session_state.chassis = []
+        st.session_state.last_chassi = ""
+    st.session_state.sessao_loja = ""
+    desconectar_sessao_compartilhada()
+
+def loja_da_contagem():
+    """Loja da sessão compartilhada (se houver) ou a digitada neste dispositivo"""
+    return st.session_state.sessao_loja or (st.session_state.get('operador_input') or '').strip()
+
+def adicionar_aviso(tipo, mensagem):
+    """Guarda uma mensagem para exibir depois do st.rerun()"""
+    st.session_state.avisos.append((tipo, mensagem))
+
+def mostrar_avisos():
+    for tipo, mensagem in st.session_state.avisos:
+        getattr(st, tipo)(mensagem)
+    st.session_state.avisos = []
+
 def criar_excel_formatado(df, operador):
     """Cria um Excel formatado com duas abas: Listagem Completa e Sumário por SKU"""
     
@@ -240,6 +529,13 @@ def main():
     
     st.divider()
     
+    # Sessão compartilhada: trazer leituras dos outros dispositivos
+    if st.session_state.sessao_codigo and sincronizar_contagem():
+        st.info(f"🔒 Sessão {st.session_state.sessao_codigo} já foi finalizada")
+    
+    # Mensagens da última leitura (sobrevivem ao st.rerun)
+    mostrar_avisos()
+    
     # Área principal - Formulário de chassis
     st.header("📝 Registrar Chassi")
     
@@ -327,15 +623,59 @@ def main():
             st.session_state.chassis = []
             st.session_state.last_chassi = ""
             st.session_state.input_key += 1
+            st.session_state.contagem_id = uuid.uuid4().hex[:8].upper()
+            sair_sessao_compartilhada()
             st.rerun()
         
         st.divider()
         
-        # Botão finalizar (só aparece se tiver chassis)
-        if st.session_state.chassis:
+        # Sessão compartilhada entre vários dispositivos
+        st.subheader("👥 Sessão Compartilhada")
+        st.caption(f"Dispositivo: {st.session_state.dispositivo_id}")
+        if st.session_state.sessao_codigo:
+            st.success(f"Sessão ativa: **{st.session_state.sessao_codigo}**")
+            st.caption(f"Loja da sessão: {st.session_state.sessao_loja}")
+            col_sync, col_sair = st.columns(2)
+            with col_sync:
+                if st.button("🔃 Sincronizar", use_container_width=True):
+                    st.rerun()
+            with col_sair:
+                if st.button("🚪 Sair", use_container_width=True):
+                    sair_sessao_compartilhada()
+                    st.rerun()
+        else:
+            codigo_sessao = st.text_input(
+                "Código da sessão:",
+                placeholder="Ex: A1B2C3",
+                key="codigo_sessao_input"
+            ).strip().upper()
+            col_entrar, col_criar = st.columns(2)
+            with col_entrar:
+                if st.button("➡️ Entrar", use_container_width=True):
+                    duplicados = None
+                    if codigo_sessao and sessao_compartilhada_aberta(codigo_sessao):
+                        duplicados = entrar_sessao_compartilhada(codigo_sessao)
+                    if duplicados is None:
+                        st.warning("⚠️ Sessão não encontrada ou já finalizada")
+                    else:
+                        if duplicados:
+                            adicionar_aviso('warning', f"⚠️ {duplicados} chassi(s) já lidos por outro dispositivo")
+                        st.rerun()
+            with col_criar:
+                if st.button("➕ Criar", use_container_width=True):
+                    if operador.strip():
+                        entrar_sessao_compartilhada(criar_sessao_compartilhada(operador.strip()))
+                        st.rerun()
+                    else:
+                        st.warning("⚠️ Digite o nome da loja")
+        
+        st.divider()
+        
+        # Botão finalizar (só aparece se tiver chassis e a sessão não foi finalizada)
+        if st.session_state.chassis and not st.session_state.sessao_finalizada:
             if st.button("✅ FINALIZAR CONTAGEM", use_container_width=True, type="primary"):
-                if operador:
-                    finalizar_automático(operador)
+                if loja_da_contagem():
+                    finalizar_automático(loja_da_contagem())
                 else:
                     st.warning("⚠️ Digite o nome da loja")
 
@@ -344,7 +684,7 @@ def main():
         st.header("📋 Chassis Registrados")
         
         # DataFrame com formatação
-        df = pd.DataFrame(st.session_state.chassis)
+        df = pd.DataFrame(st.session_state.chassis).drop(columns=['seq'], errors='ignore')
         st.dataframe(df, use_container_width=True, hide_index=True)
         
         # Estatísticas rápidas
@@ -359,17 +699,30 @@ def main():
             st.metric("Não Encontrados", nao_encontrados)
             
         # Aviso sobre finalização
-        if not st.session_state.get('operador_input'):
-            st.warning("👆 **Digite o nome da loja na sidebar para finalizar**")
+        if not loja_da_contagem():
+            st.warning("👆 **Digite o nome da loja na sidebar para continuar e finalizar**")
 
 def registrar_chassi(chassi_numero):
     """Registra um chassi"""
     if not chassi_numero:
         return
+    
+    # A loja é necessária para o índice global de avistamentos
+    loja = loja_da_contagem()
+    if not normalizar_loja(loja):
+        st.session_state.last_chassi = ""
+        adicionar_aviso('warning', f"⚠️ Digite o nome da loja na sidebar antes de ler o chassi {chassi_numero}")
+        return
         
     # Verificar duplicado
-    if any(c['chassi'] == chassi_numero for c in st.session_state.chassis):
-        st.warning(f"⚠️ Chassi {chassi_numero} já foi registrado!")
+    codigo_sessao = st.session_state.sessao_codigo
+    if codigo_sessao:
+        existente = buscar_chassi_compartilhado(codigo_sessao, chassi_numero)
+        if existente:
+            adicionar_aviso('warning', f"⚠️ Chassi {chassi_numero} já foi registrado pelo dispositivo {existente['dispositivo']}!")
+            return
+    elif any(c['chassi'] == chassi_numero for c in st.session_state.chassis):
+        adicionar_aviso('warning', f"⚠️ Chassi {chassi_numero} já foi registrado!")
         return
     
     # Consultar banco
@@ -390,7 +743,6 @@ def registrar_chassi(chassi_numero):
                     'montador': montador,
                     'status': 'Encontrado'
                 }
-                st.success(f"✅ **{chassi_numero}** - {descricao}")
             else:
                 registro = {
                     'chassi': chassi_numero,
@@ -400,19 +752,69 @@ def registrar_chassi(chassi_numero):
                     'montador': 'N/A',
                     'status': 'Não encontrado'
                 }
-                st.error(f"❌ **{chassi_numero}** - Não encontrado")
-            
-            st.session_state.chassis.append(registro)
             cur.close()
-            conn.close()
+            
+            # Número de sequência do dispositivo, fixado na leitura e reaproveitado em reenvios
+            st.session_state.seq_dispositivo += 1
+            registro['seq'] = st.session_state.seq_dispositivo
+            
+            if codigo_sessao:
+                # Publica na sessão; a primeira leitura aceita pelo servidor vence
+                status, existente = publicar_registro_compartilhado(
+                    codigo_sessao, st.session_state.dispositivo_id, registro
+                )
+                sincronizar_contagem()
+                if status == 'duplicado':
+                    adicionar_aviso('warning', f"⚠️ Chassi {chassi_numero} já foi registrado pelo dispositivo {existente['dispositivo']}!")
+                    return
+                if status == 'finalizada':
+                    adicionar_aviso('warning', f"⚠️ Sessão {codigo_sessao} já foi finalizada")
+                    return
+                if status == 'inexistente':
+                    # Sessão removida: a leitura entra na lista local, mantida por sincronizar_contagem()
+                    desconectar_sessao_compartilhada()
+                    if any(c['chassi'] == chassi_numero for c in st.session_state.chassis):
+                        adicionar_aviso('warning', f"⚠️ Chassi {chassi_numero} já foi registrado!")
+                        return
+                    st.session_state.chassis.append(registro)
+            else:
+                st.session_state.chassis.append(registro)
+            
+            if registro['status'] == 'Encontrado':
+                adicionar_aviso('success', f"✅ **{chassi_numero}** - {registro['descricao']}")
+            else:
+                adicionar_aviso('error', f"❌ **{chassi_numero}** - Não encontrado")
+            
+            # Índice global: avisar se o chassi já foi contado em outra loja hoje
+            sessao_avistamento = codigo_sessao or st.session_state.contagem_id
+            anterior = registrar_avistamento(conn, chassi_numero, loja, sessao_avistamento)
+            if (anterior and anterior['sessao'] != sessao_avistamento and
+                    normalizar_loja(anterior['loja']) != normalizar_loja(loja) and
+                    anterior['registrado_em'].astimezone(fuso_brasilia).date() == datetime.now(fuso_brasilia).date()):
+                adicionar_aviso(
+                    'warning',
+                    f"🚨 Chassi {chassi_numero} também foi contado hoje na loja **{anterior['loja']}** "
+                    f"({anterior['registrado_em'].astimezone(fuso_brasilia).strftime('%H:%M')})"
+                )
             
         except Exception as e:
-            st.error(f"Erro na consulta: {str(e)}")
+            adicionar_aviso('error', f"Erro na consulta: {str(e)}")
+        finally:
+            conn.close()
     else:
-        st.error("❌ Erro de conexão com o banco")
+        adicionar_aviso('error', "❌ Erro de conexão com o banco")
 
 def finalizar_automático(operador):
     """Finaliza automaticamente - gera Excel e envia email"""
+    codigo_sessao = st.session_state.sessao_codigo
+    # Sessão compartilhada gera um único relatório: só quem finalizar primeiro continua
+    if codigo_sessao:
+        if not finalizar_sessao_compartilhada(codigo_sessao):
+            st.session_state.sessao_finalizada = True
+            st.warning(f"🔒 Sessão {codigo_sessao} já foi finalizada por outro dispositivo")
+            return
+        # Garante que o relatório inclua tudo o que foi aceito até a finalização
+        sincronizar_contagem()
     try:
         # Gerar Excel FORMATADO com duas abas
         df = pd.DataFrame(st.session_state.chassis)
@@ -457,6 +859,9 @@ def finalizar_automático(operador):
             )
             
     except Exception as e:
+        if codigo_sessao:
+            reabrir_sessao_compartilhada(codigo_sessao)
+            st.session_state.sessao_finalizada = False
         st.error(f"❌ Erro ao finalizar: {str(e)}")
 
 def enviar_email_automatico(arquivo, operador, df):
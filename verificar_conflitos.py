@@ -0,0 +1,135 @@
+"""Verificação noturna: chassis contados em mais de uma loja no mesmo dia.
+
+Uso: python verificar_conflitos.py [AAAA-MM-DD]   (padrão: ontem)
+
+Feita para rodar depois da meia-noite (horário de Brasília), verificando o dia
+anterior. As leituras do dia vêm ordenadas por chassi, então cada chassi é
+verificado uma única vez em vez de comparar as sessões duas a duas. Leituras
+mais antigas que RETENCAO_DIAS são apagadas de leituras_contagem.
+"""
+import os
+import sys
+from datetime import datetime, timezone, timedelta
+from itertools import groupby
+
+import pandas as pd
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Fuso horário de Brasília
+fuso_brasilia = timezone(timedelta(hours=-3))
+
+# Dias de histórico mantidos em leituras_contagem
+RETENCAO_DIAS = 90
+
+
+def normalizar_loja(nome):
+    """Mesma normalização usada no app ("Salim Atibaia" == "salim atibaia ")"""
+    return (nome or '').strip().casefold()
+
+
+def carregar_leituras(conn, inicio, fim):
+    """Retorna as leituras do dia como (chassi, loja, sessao, registrado_em), ordenadas por chassi"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT chassi, loja, sessao, registrado_em
+        FROM leituras_contagem
+        WHERE registrado_em >= %s AND registrado_em < %s
+        ORDER BY chassi, registrado_em
+    """, (inicio, fim))
+    leituras = cur.fetchall()
+    cur.close()
+    return leituras
+
+
+def apagar_leituras_antigas(conn, limite):
+    """Remove do histórico as leituras anteriores ao limite; retorna quantas foram apagadas"""
+    cur = conn.cursor()
+    cur.execute("DELETE FROM leituras_contagem WHERE registrado_em < %s", (limite,))
+    apagadas = cur.rowcount
+    conn.commit()
+    cur.close()
+    return apagadas
+
+
+def encontrar_conflitos(leituras):
+    """Percorre as leituras ordenadas e devolve os chassis vistos em mais de uma loja.
+
+    Só há conflito entre sessões diferentes: com duas ou mais sessões e duas ou
+    mais lojas, sempre existe um par de sessões distintas com lojas distintas.
+    """
+    conflitos = []
+    for chassi, grupo in groupby(leituras, key=lambda leitura: leitura[0]):
+        grupo = list(grupo)
+        lojas = {normalizar_loja(loja) for _, loja, _, _ in grupo}
+        sessoes = {sessao for _, _, sessao, _ in grupo}
+        if len(lojas) > 1 and len(sessoes) > 1:
+            for _, loja, sessao, registrado_em in grupo:
+                conflitos.append({
+                    'chassi': chassi,
+                    'loja': loja,
+                    'sessao': sessao,
+                    'data': registrado_em.astimezone(fuso_brasilia).strftime("%d/%m/%Y %H:%M")
+                })
+    return conflitos
+
+
+def main():
+    if len(sys.argv) > 1:
+        try:
+            dia = datetime.strptime(sys.argv[1], "%Y-%m-%d").date()
+        except ValueError:
+            print(f"❌ Data inválida: {sys.argv[1]} (use AAAA-MM-DD)")
+            return 1
+    else:
+        dia = datetime.now(fuso_brasilia).date() - timedelta(days=1)
+    inicio = datetime(dia.year, dia.month, dia.day, tzinfo=fuso_brasilia)
+    fim = inicio + timedelta(days=1)
+
+    print(f"🔍 Verificando conflitos de {dia.strftime('%d/%m/%Y')}")
+
+    try:
+        conn = psycopg2.connect(
+            host=os.getenv('NEON_HOST'),
+            database=os.getenv('NEON_DATABASE'),
+            user=os.getenv('NEON_USER'),
+            password=os.getenv('NEON_PASSWORD'),
+            port=os.getenv('NEON_PORT'),
+            sslmode='require'
+        )
+    except Exception as e:
+        print(f"❌ Erro de conexão: {e}")
+        return 1
+
+    try:
+        leituras = carregar_leituras(conn, inicio, fim)
+        apagadas = apagar_leituras_antigas(conn, inicio - timedelta(days=RETENCAO_DIAS))
+    except Exception as e:
+        print(f"❌ Erro na consulta: {e}")
+        return 1
+    finally:
+        conn.close()
+
+    if apagadas:
+        print(f"🧹 Leituras com mais de {RETENCAO_DIAS} dias apagadas: {apagadas}")
+
+    conflitos = encontrar_conflitos(leituras)
+    print(f"📋 Leituras analisadas: {len(leituras)} em {len({leitura[2] for leitura in leituras})} sessões")
+
+    if not conflitos:
+        print("✅ Nenhum chassi contado em mais de uma loja")
+        return 0
+
+    df = pd.DataFrame(conflitos)
+    filename = f"conflitos_chassi_{dia.strftime('%Y%m%d')}.xlsx"
+    df.to_excel(filename, index=False, sheet_name='Conflitos')
+
+    print(f"🚨 Chassis em mais de uma loja: {df['chassi'].nunique()}")
+    print(f"📄 Relatório: {filename}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())